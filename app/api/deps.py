@@ -1,36 +1,23 @@
-from typing import Generator, Optional
+from typing import Any, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 from app.core import security
 from app.core.config import settings
-from app.db.session import get_session_local
+from app.db.session import get_db
 from app.crud import user as crud_user
 from app.schemas.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db() -> Generator:
-    SessionLocal = get_session_local()
-    try:
-        db = SessionLocal()
-        yield db
-    finally:
-        db.close()
-
-def get_current_user(
-    db: Session = Depends(get_db),
-    token: str = Depends(oauth2_scheme)
-) -> User:
+def _get_token_user_id(token: str) -> int:
     user_id = security.verify_token(token)
     if not user_id:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    user = crud_user.get_user(db, user_id=user_id)
+        raise security.credentials_exception()
+    return user_id
+
+def _check_user(user: Optional[Any]) -> None:
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -41,4 +28,28 @@ def get_current_user(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
-    return user 
+
+def get_current_user(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> User:
+    user_id = _get_token_user_id(token)
+    cached_user = crud_user.get_cached_user(user_id)
+    if cached_user is not None:
+        return cached_user
+    user = crud_user.get_user(db, user_id=user_id)
+    _check_user(user)
+    current_user = User.model_validate(user)
+    crud_user.cache_user(user_id, current_user)
+    return current_user
+
+def get_current_user_id(
+    db: Session = Depends(get_db),
+    token: str = Depends(oauth2_scheme)
+) -> int:
+    """Authenticate the request without loading the full user row"""
+    user_id = _get_token_user_id(token)
+    if crud_user.get_cached_user(user_id) is not None:
+        return user_id
+    _check_user(crud_user.get_user_auth_fields(db, user_id=user_id))
+    return user_id
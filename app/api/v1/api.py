@@ -1,9 +1,5 @@
 from fastapi import APIRouter
 
-import logging
-
-logging.debug("||| app/api/v1/api.py is imported (or reimported) |||")
-
 from app.api.v1.endpoints import auth
 from app.api.v1.endpoints import users
 
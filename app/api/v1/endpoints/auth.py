@@ -13,39 +13,36 @@ from app.schemas.user import User, UserCreate, Token
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+ACCESS_TOKEN_EXPIRES = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
 @router.post("/login", response_model=Token)
-def login(
+async def login(
     db: Session = Depends(deps.get_db),
     form_data: OAuth2PasswordRequestForm = Depends()
 ) -> Token:
     """
     OAuth2 compatible token login, get an access token for future requests
     """
-    logger.debug(f"Login attempt for user: {form_data.username}")
-
-    user = crud_user.authenticate_user(
+    user = await crud_user.authenticate_user(
         db, username=form_data.username, password=form_data.password
     )
     if not user:
-        logger.debug(f"Authentication failed for user: {form_data.username}")
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     elif not user.is_active:
-        logger.debug(f"Login attempt for inactive user: {form_data.username}")
+        logger.debug("Login attempt for inactive user: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
     
-    logger.debug(f"Creating access token for user: {form_data.username}")
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
-        user.id, expires_delta=access_token_expires
+        user.id, expires_delta=ACCESS_TOKEN_EXPIRES
     )
-    logger.debug(f"Successfully created access token for user: {form_data.username}")
+    logger.debug("Issued access token for user: %s", form_data.username)
     
     return Token(
         access_token=access_token,
@@ -61,17 +58,11 @@ def register(
     """
     Create new user.
     """
-    user = crud_user.get_user_by_email(db, email=user_in.email)
-    if user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this email already exists in the system.",
-        )
-    user = crud_user.get_user_by_username(db, username=user_in.username)
-    if user:
+    try:
+        user = crud_user.create_user(db, user_in)
+    except crud_user.DuplicateUserError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this username already exists in the system.",
+            detail=str(e),
         )
-    user = crud_user.create_user(db, user_in)
     return user 
\ No newline at end of file
@@ -1,7 +1,5 @@
-import logging
-logging.getLogger(__name__).debug("[IMPORT] app.api.v1.endpoints.users imported")
 from typing import List
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 
 from app.api import deps
@@ -12,47 +10,46 @@ from app.schemas.user import User, UserCreate, UserUpdate
 router = APIRouter()
 
 @router.get("", response_model=List[User])
-@router.get("/", response_model=List[User])
 def read_users(
+    response: Response,
     db: Session = Depends(deps.get_db),
-    skip: int = 0,
+    after_id: int = 0,
     limit: int = 100,
-    current_user: User = Depends(deps.get_current_user),
+    skip: int = Query(0, deprecated=True),
+    current_user_id: int = Depends(deps.get_current_user_id),
 ) -> List[User]:
     """
-    Retrieve users.
+    Retrieve users ordered by id.
+
+    A full page sets the X-Next-Cursor header; pass it back as after_id
+    to fetch the next page.
     """
-    users = crud_user.get_users(db, skip=skip, limit=limit)
+    users = crud_user.get_users(db, after_id=after_id, limit=limit, skip=skip)
+    if users and len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
     return users
 
 @router.post("", response_model=User)
-@router.post("/", response_model=User)
 def create_user(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserCreate,
-    current_user: User = Depends(deps.get_current_user),
+    current_user_id: int = Depends(deps.get_current_user_id),
 ) -> User:
     """
     Create new user.
     """
-    user = crud_user.get_user_by_email(db, email=user_in.email)
-    if user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this email already exists in the system.",
-        )
-    user = crud_user.get_user_by_username(db, username=user_in.username)
-    if user:
+    try:
+        user = crud_user.create_user(db, user_in)
+    except crud_user.DuplicateUserError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="The user with this username already exists in the system.",
+            detail=str(e),
         )
-    user = crud_user.create_user(db, user_in)
     return user
 
 @router.get("/me", response_model=User)
-def read_user_me(
+async def read_user_me(
     current_user: User = Depends(deps.get_current_user),
 ) -> User:
     """
@@ -65,18 +62,24 @@ def update_user_me(
     *,
     db: Session = Depends(deps.get_db),
     user_in: UserUpdate,
-    current_user: User = Depends(deps.get_current_user),
+    current_user_id: int = Depends(deps.get_current_user_id),
 ) -> User:
     """
     Update own user.
     """
-    user = crud_user.update_user(db, user_id=current_user.id, user=user_in)
+    try:
+        user = crud_user.update_user(db, user_id=current_user_id, user=user_in)
+    except crud_user.DuplicateUserError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e),
+        )
     return user
 
 @router.get("/{user_id}", response_model=User)
 def read_user_by_id(
     user_id: int,
-    current_user: User = Depends(deps.get_current_user),
+    current_user_id: int = Depends(deps.get_current_user_id),
     db: Session = Depends(deps.get_db),
 ) -> User:
     """
@@ -95,16 +98,15 @@ def delete_user(
     *,
     db: Session = Depends(deps.get_db),
     user_id: int,
-    current_user: User = Depends(deps.get_current_user),
+    current_user_id: int = Depends(deps.get_current_user_id),
 ) -> User:
     """
     Delete a user.
     """
-    user = crud_user.get_user(db, user_id=user_id)
+    user = crud_user.delete_user(db, user_id=user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    user = crud_user.delete_user(db, user_id=user_id)
     return user 
\ No newline at end of file
@@ -13,6 +13,13 @@ class Settings(BaseSettings):
     POSTGRES_DB: str = "app"
     POSTGRES_PORT: str = "5432"
     DATABASE_URL: Optional[PostgresDsn] = None
+    DB_POOL_SIZE: int = 20
+    DB_MAX_OVERFLOW: int = 10
+
+    # Worker threads available to sync endpoints and dependencies
+    THREADPOOL_SIZE: int = 40
+    # Threads reserved for bcrypt so login bursts can't starve THREADPOOL_SIZE
+    PASSWORD_HASH_THREADS: int = 4
 
     @validator("DATABASE_URL", pre=True)
     def assemble_db_connection(cls, v: Optional[str], values: dict[str, any]) -> any:
@@ -29,10 +36,11 @@ class Settings(BaseSettings):
 
     SECRET_KEY: str = "your-secret-key-here"  # Change in production
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 8  # 8 days
+    BCRYPT_ROUNDS: int = 12  # Work factor for new password hashes; 4 is the minimum
     
     ENVIRONMENT: str = "development"
     
-    # Encryption key for sensitive data - must be set via environment variable
+    # Fernet key legacy passwords were encrypted with; they are rehashed to bcrypt on login
     ENCRYPTION_KEY: str  # No default value, must be provided
 
     class Config:
@@ -1,34 +1,150 @@
-from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
+import asyncio
+import hashlib
+import hmac
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from typing import List, Optional, Tuple
+from cachetools import TTLCache
+from cryptography.fernet import Fernet, InvalidToken
+import orjson
+import pybase64
+from passlib.context import CryptContext
 from fastapi import HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
 
 from app.core.config import settings
-from app.schemas.user import TokenPayload
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+_password_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_THREADS, thread_name_prefix="password-hash"
+)
+
+# Tokens are always HS256, so the key bytes and encoded header are fixed
+_KEY = settings.SECRET_KEY.encode()
+_HEADER_B64 = b"eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9"  # {"alg":"HS256","typ":"JWT"}
+# Keyed once; copying it skips re-deriving the HMAC pads for every token
+_HMAC_TEMPLATE = hmac.new(_KEY, None, hashlib.sha256)
+_ACCESS_TOKEN_EXPIRE_SECONDS = settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60
+
+def credentials_exception() -> HTTPException:
+    """A new 401 for a bad token; never shared, as raising mutates the exception"""
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+# Verified tokens, keyed by sha256(token) digest -> (user_id, exp)
+_token_cache: TTLCache[bytes, Tuple[int, float]] = TTLCache(
+    maxsize=4096, ttl=min(300, _ACCESS_TOKEN_EXPIRE_SECONDS)
+)
+_token_cache_lock = threading.Lock()
+
+def get_password_hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return pwd_context.verify(plain_password, hashed_password)
+    except ValueError:
+        # Unrecognised hash format, e.g. a legacy Fernet token
+        return False
+
+def is_password_hash(stored_password: str) -> bool:
+    """Whether stored_password is a hash pwd_context understands, not a legacy Fernet token"""
+    return pwd_context.identify(stored_password) is not None
+
+def verify_legacy_password(plain_password: str, stored_password: str) -> bool:
+    """Check a password stored Fernet-encrypted with ENCRYPTION_KEY, from before bcrypt"""
+    try:
+        decrypted = Fernet(settings.ENCRYPTION_KEY).decrypt(stored_password.encode())
+    except (InvalidToken, ValueError):
+        return False
+    return hmac.compare_digest(decrypted, plain_password.encode())
+
+async def get_password_hash_async(password: str) -> str:
+    """get_password_hash on the dedicated hashing threads, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_password_executor, get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the dedicated hashing threads, off the event loop"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _password_executor, verify_password, plain_password, hashed_password
+    )
+
+def _b64encode(data: bytes) -> bytes:
+    return pybase64.urlsafe_b64encode(data).rstrip(b"=")
+
+def _b64decode(data: bytes) -> bytes:
+    decoded = pybase64.b64decode(data + b"=" * (-len(data) % 4), altchars=b"-_", validate=True)
+    # Only the canonical unpadded encoding is accepted, so no two strings decode alike
+    if _b64encode(decoded) != data:
+        raise ValueError("Non-canonical base64url segment")
+    return decoded
+
+def _sign(signing_input: bytes) -> bytes:
+    mac = _HMAC_TEMPLATE.copy()
+    mac.update(signing_input)
+    return mac.digest()
+
+def _decode_token(token: str) -> dict:
+    """Return the claims of a valid, unexpired HS256 token, else raise ValueError"""
+    header_b64, payload_b64, signature_b64 = token.encode("ascii").split(b".")
+    # Only our own header is accepted, which also rules out alg=none
+    if header_b64 != _HEADER_B64:
+        raise ValueError("Unexpected token header")
+    payload = orjson.loads(_b64decode(payload_b64))
+    if not isinstance(payload, dict):
+        raise ValueError("Token payload is not an object")
+    # Reject expired tokens before paying for the HMAC
+    exp = payload.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+        raise ValueError("Token has expired")
+    expected = _sign(header_b64 + b"." + payload_b64)
+    if not hmac.compare_digest(_b64decode(signature_b64), expected):
+        raise ValueError("Signature verification failed")
+    return payload
 
 def create_access_token(subject: int, expires_delta: Optional[timedelta] = None) -> str:
-    if expires_delta:
-        expire = datetime.utcnow() + expires_delta
-    else:
-        expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    lifetime = expires_delta.total_seconds() if expires_delta else _ACCESS_TOKEN_EXPIRE_SECONDS
+    # exp is whole seconds; round up so a token never expires before its full lifetime
+    expire = math.ceil(time.time() + lifetime)
     
     to_encode = {"exp": expire, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm="HS256")
-    return encoded_jwt
+    signing_input = _HEADER_B64 + b"." + _b64encode(orjson.dumps(to_encode))
+    return (signing_input + b"." + _b64encode(_sign(signing_input))).decode("ascii")
 
 def verify_token(token: str) -> Optional[int]:
+    key = hashlib.sha256(token.encode()).digest()
+    with _token_cache_lock:
+        cached = _token_cache.get(key)
+    # Never serve a cached id past the token's own expiry
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=["HS256"])
-        token_data = TokenPayload(**payload)
-        if token_data.sub is None:
-            return None
-        return int(token_data.sub)
-    except JWTError:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
-        ) 
\ No newline at end of file
+        payload = _decode_token(token)
+        sub = payload.get("sub")
+        user_id = int(sub) if sub is not None else None
+    except (ValueError, TypeError):
+        payload = None
+    if payload is None:
+        raise credentials_exception()
+    if user_id is None:
+        return None
+
+    exp = payload.get("exp")
+    if exp is not None:
+        with _token_cache_lock:
+            _token_cache[key] = (user_id, exp)
+    return user_id
+
+def verify_tokens(tokens: List[str]) -> List[Optional[int]]:
+    """verify_token for a batch of tokens; raises on the first invalid one"""
+    return [verify_token(token) for token in tokens]
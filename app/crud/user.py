@@ -1,72 +1,149 @@
 import logging
-from typing import Optional, List
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence
+from cachetools import TTLCache
+from psycopg2 import errorcodes
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.engine import Row
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
+from app.core import security
 from app.models.user import User
-from app.schemas.user import UserCreate, UserUpdate
+from app.schemas.user import User as UserSchema, UserCreate, UserUpdate
 
 logger = logging.getLogger(__name__)
 
+class DuplicateUserError(Exception):
+    """Raised when a write collides with another user's email or username"""
+
+    def __init__(self, field: str):
+        super().__init__(f"The user with this {field} already exists in the system.")
+        self.field = field
+
+@contextmanager
+def _unique_user_fields(db: Session) -> Iterator[None]:
+    """Translate unique email/username violations into DuplicateUserError"""
+    try:
+        yield
+    except IntegrityError as e:
+        db.rollback()
+        if getattr(e.orig, "pgcode", None) != errorcodes.UNIQUE_VIOLATION:
+            raise
+        # e.g. "ix_users_email" from create_all or "users_email_key" from a UNIQUE constraint
+        constraint = getattr(getattr(e.orig, "diag", None), "constraint_name", None) or ""
+        for field in ("email", "username"):
+            if field in constraint:
+                raise DuplicateUserError(field) from e
+        raise
+
+# Authenticated users' API representations, keyed by user id
+_user_cache: TTLCache[int, UserSchema] = TTLCache(maxsize=5000, ttl=30)
+_user_cache_lock = threading.Lock()
+
+def get_cached_user(user_id: int) -> Optional[UserSchema]:
+    with _user_cache_lock:
+        return _user_cache.get(user_id)
+
+def cache_user(user_id: int, user: UserSchema) -> None:
+    with _user_cache_lock:
+        _user_cache[user_id] = user
+
+def invalidate_cached_user(user_id: int) -> None:
+    with _user_cache_lock:
+        _user_cache.pop(user_id, None)
+
 def get_user(db: Session, user_id: int) -> Optional[User]:
-    return db.query(User).filter(User.id == user_id).first()
+    return db.scalars(select(User).where(User.id == user_id)).first()
+
+def get_user_auth_fields(db: Session, user_id: int) -> Optional[Row]:
+    """Return only (id, is_active), which is all request authentication needs"""
+    return db.execute(select(User.id, User.is_active).where(User.id == user_id)).first()
 
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
-    return db.query(User).filter(User.email == email).first()
+    return db.scalars(select(User).where(User.email == email)).first()
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
-    return db.query(User).filter(User.username == username).first()
+    return db.scalars(select(User).where(User.username == username)).first()
+
+def get_user_credentials(db: Session, username: str) -> Optional[Row]:
+    """Return (id, is_active, hashed_password), the columns login needs"""
+    stmt = select(User.id, User.is_active, User.hashed_password).where(User.username == username)
+    return db.execute(stmt).first()
 
-def get_users(db: Session, skip: int = 0, limit: int = 100) -> List[User]:
-    return db.query(User).offset(skip).limit(limit).all()
+def get_users(db: Session, after_id: int = 0, limit: int = 100, skip: int = 0) -> Sequence[User]:
+    """Page through users by id; skip is a deprecated OFFSET kept for old clients"""
+    stmt = select(User).where(User.id > after_id).order_by(User.id).limit(limit)
+    if skip:
+        stmt = stmt.offset(skip)
+    return db.scalars(stmt).all()
 
 def create_user(db: Session, user: UserCreate) -> User:
-    db_user = User(
-        username=user.username,
-        email=user.email,
-        is_active=user.is_active
+    stmt = (
+        insert(User)
+        .values(
+            username=user.username,
+            email=user.email,
+            hashed_password=security.get_password_hash(user.password),
+            is_active=user.is_active,
+        )
+        .returning(User)
     )
-    db_user.set_password(user.password)
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    with _unique_user_fields(db):
+        db_user = db.execute(stmt).scalar_one()
+        db.commit()
     return db_user
 
 def update_user(db: Session, user_id: int, user: UserUpdate) -> Optional[User]:
-    db_user = get_user(db, user_id)
-    if not db_user:
-        return None
-    
     update_data = user.model_dump(exclude_unset=True)
     if "password" in update_data:
-        db_user.set_password(update_data.pop("password"))
-    
-    for field, value in update_data.items():
-        setattr(db_user, field, value)
-    
-    db.commit()
-    db.refresh(db_user)
+        update_data["hashed_password"] = security.get_password_hash(update_data.pop("password"))
+    if not update_data:
+        return get_user(db, user_id)
+
+    stmt = update(User).where(User.id == user_id).values(**update_data).returning(User)
+    with _unique_user_fields(db):
+        db_user = db.execute(stmt).scalar_one_or_none()
+        db.commit()
+    invalidate_cached_user(user_id)
     return db_user
 
+def set_password_hash(db: Session, user_id: int, hashed_password: str) -> None:
+    db.execute(update(User).where(User.id == user_id).values(hashed_password=hashed_password))
+    db.commit()
+
 def delete_user(db: Session, user_id: int) -> Optional[User]:
-    db_user = get_user(db, user_id)
-    if db_user:
-        db.delete(db_user)
-        db.commit()
+    stmt = delete(User).where(User.id == user_id).returning(User)
+    db_user = db.execute(stmt).scalar_one_or_none()
+    if db_user is not None:
+        # Detach so the commit doesn't expire it and try to reload a deleted row
+        db.expunge(db_user)
+    db.commit()
+    invalidate_cached_user(user_id)
     return db_user
 
-def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
-    """Authenticate a user by username and password"""
-    logger.debug(f"Attempting to authenticate user: {username}")
+async def authenticate_user(db: Session, username: str, password: str) -> Optional[Row]:
+    """Authenticate a user by username and password, returning their credentials row"""
+    logger.debug("Attempting to authenticate user: %s", username)
     
-    user = get_user_by_username(db, username)
+    user = await run_in_threadpool(get_user_credentials, db, username)
     if not user:
-        logger.debug(f"User not found: {username}")
+        logger.debug("User not found: %s", username)
         return None
         
-    logger.debug(f"User found, verifying password for user: {username}")
-    if not user.verify_password(password):
-        logger.debug(f"Password verification failed for user: {username}")
+    if not security.is_password_hash(user.hashed_password):
+        # Accounts from before bcrypt still hold a Fernet token; upgrade it on first login
+        if not security.verify_legacy_password(password, user.hashed_password):
+            logger.debug("Password verification failed for user: %s", username)
+            return None
+        hashed_password = await security.get_password_hash_async(password)
+        await run_in_threadpool(set_password_hash, db, user.id, hashed_password)
+        logger.info("Rehashed legacy password for user: %s", username)
+    elif not await security.verify_password_async(password, user.hashed_password):
+        logger.debug("Password verification failed for user: %s", username)
         return None
         
-    logger.debug(f"Successfully authenticated user: {username}")
-    return user 
\ No newline at end of file
+    logger.debug("Successfully authenticated user: %s", username)
+    return user
\ No newline at end of file
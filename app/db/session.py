@@ -1,22 +1,50 @@
+import threading
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from typing import Generator
+from sqlalchemy.orm import Session, declarative_base, scoped_session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from app.core.config import settings
 
 Base = declarative_base()
 
-def get_engine():
-    return create_engine(str(settings.DATABASE_URL))
+# Built once per process so every request draws from the same connection pool
+engine = create_engine(
+    str(settings.DATABASE_URL),
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    query_cache_size=1200,
+)
 
-def get_session_local():
-    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+_request_scope: ContextVar[Optional[object]] = ContextVar("db_request_scope", default=None)
 
-# Dependency
-def get_db() -> Generator:
-    SessionLocal = get_session_local()
-    db = SessionLocal()
+def _session_scope() -> object:
+    # One session per HTTP request; outside a request, one per thread
+    scope = _request_scope.get()
+    return scope if scope is not None else threading.get_ident()
+
+SessionLocal = scoped_session(
+    sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine),
+    scopefunc=_session_scope,
+)
+
+@asynccontextmanager
+async def request_session_scope() -> AsyncIterator[None]:
+    """Give the enclosed request its own session and return it to the pool afterwards"""
+    token = _request_scope.set(object())
     try:
-        yield db
+        yield
     finally:
-        db.close() 
+        # Closing returns a connection to the pool, so only hop to a thread if one was opened
+        if SessionLocal.registry.has():
+            await run_in_threadpool(SessionLocal.remove)
+        _request_scope.reset(token)
+
+# Dependency
+async def get_db() -> Session:
+    return SessionLocal()
@@ -1,13 +1,23 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from anyio import to_thread
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import api_router
 from app.core.config import settings
+from app.db.session import request_session_scope
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Sync endpoints run on AnyIO's worker threads; size that pool explicitly
+    to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    yield
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
     version=settings.VERSION,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 # Set all CORS enabled origins
@@ -17,14 +27,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.middleware("http")
+async def db_session_middleware(request: Request, call_next):
+    async with request_session_scope():
+        return await call_next(request)
+
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
 @app.get("/")
-def root():
+async def root():
     return {"message": "Welcome to FastAPI Backend"}
 
 @app.get("/api/v1/health")
-def health_check():
+async def health_check():
     return {"status": "ok"} 
\ No newline at end of file
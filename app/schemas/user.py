@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, EmailStr, constr
+from typing import Any, Optional
+from pydantic import BaseModel, EmailStr, constr, field_validator
 
 # Shared properties
 class UserBase(BaseModel):
@@ -19,6 +19,14 @@ class UserUpdate(BaseModel):
     password: Optional[constr(min_length=8)] = None
     is_active: Optional[bool] = None
 
+    @field_validator("username", "email", "password", "is_active")
+    @classmethod
+    def not_null(cls, v: Any) -> Any:
+        # Fields may be omitted, but an explicit null would try to clear a NOT NULL column
+        if v is None:
+            raise ValueError("may be omitted but not null")
+        return v
+
 # Properties shared by models stored in DB
 class UserInDBBase(UserBase):
     id: int
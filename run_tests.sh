@@ -1,7 +1,7 @@
 #!/bin/bash
 
 # Install required packages if not already installed
-pip install -q requests uvicorn testcontainers
+pip install -q testcontainers
 
 # Run the tests
 echo "Running tests..."
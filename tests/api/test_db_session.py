@@ -0,0 +1,54 @@
+import pytest
+from typing import Dict, Generator, List
+from fastapi import status
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.crud import user as crud_user
+from app.db.session import SessionLocal, engine, get_db
+from app.main import app
+
+@pytest.fixture
+def real_sessions(db_engine, test_user_id: int) -> Generator[List[Session], None, None]:
+    """Serve get_db from the app's own scoped_session, recording each session it creates"""
+    override = app.dependency_overrides.pop(get_db)
+    SessionLocal.configure(bind=db_engine)
+    create = SessionLocal.registry.createfunc
+    created: List[Session] = []
+
+    def _record() -> Session:
+        session = create()
+        created.append(session)
+        return session
+
+    SessionLocal.registry.createfunc = _record
+    crud_user.invalidate_cached_user(test_user_id)
+    try:
+        yield created
+    finally:
+        # Close anything a broken middleware left open so teardown's drop_all can't hang
+        for session in created:
+            session.close()
+        SessionLocal.registry.clear()
+        SessionLocal.registry.createfunc = create
+        SessionLocal.configure(bind=engine)
+        crud_user.invalidate_cached_user(test_user_id)
+        app.dependency_overrides[get_db] = override
+
+def test_request_session_is_removed(
+    app_client: TestClient, test_user_token: Dict[str, str], test_user_id: int,
+    real_sessions: List[Session],
+) -> None:
+    for _ in range(2):
+        crud_user.invalidate_cached_user(test_user_id)
+        response = app_client.get("/api/v1/users/me", headers=test_user_token)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.json()["username"] == "testuser"
+
+    # One fresh session per request, each closed and dropped from the registry
+    assert len(real_sessions) == 2
+    assert real_sessions[0] is not real_sessions[1]
+    for session in real_sessions:
+        assert not session.in_transaction()
+        assert len(session.identity_map) == 0
+    assert not SessionLocal.registry.registry
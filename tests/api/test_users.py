@@ -1,165 +1,185 @@
 import pytest
 from fastapi import status
 from fastapi.testclient import TestClient
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import logging
-from contextlib import contextmanager
-from typing import Generator, Callable
 
+from app.crud import user as crud_user
 from app.models.user import User
-from app.main import app
-from app.api import deps
+from app.schemas.user import UserUpdate
+from tests.utils import assert_detail
 
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-@contextmanager
-def override_get_db(db: Session) -> Generator[None, None, None]:
-    """Context manager to override the get_db dependency with a test session"""
-    def _override_get_db():
-        try:
-            yield db
-        finally:
-            pass
-    
-    app.dependency_overrides[deps.get_db] = _override_get_db
-    try:
-        yield
-    finally:
-        app.dependency_overrides.clear()
-
-def verify_test_user(db: Session, test_user: User) -> None:
-    """Verify that the test user exists in the database and matches the fixture"""
-    logger.debug("Verifying test user exists in database")
-    db_user = db.query(User).filter(User.username == "testuser").first()
-    assert db_user is not None, "Test user should exist in database"
-    assert db_user.id == test_user.id, "Should be the same user created by fixture"
-    return db_user
-
 def test_read_users(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    verify_test_user(db, test_user)
-    with override_get_db(db):
-        response = test_user_client.get("/api/v1/users")
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert len(data) == 1
-        assert data[0]["username"] == "testuser"
-        assert data[0]["email"] == "test@example.com"
-        assert "password" not in data[0]
-        assert "hashed_password" not in data[0]
+    response = test_user_client.get("/api/v1/users")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert len(data) == 1
+    assert data[0]["username"] == "testuser"
+    assert data[0]["email"] == "test@example.com"
+    assert "password" not in data[0]
+    assert "hashed_password" not in data[0]
+
+def test_read_users_pagination(
+    test_user_client: TestClient, test_user: User, other_user: User
+) -> None:
+    response = test_user_client.get("/api/v1/users", params={"limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [user["username"] for user in data] == ["testuser"]
+    cursor = response.headers["X-Next-Cursor"]
+    assert cursor == str(test_user.id)
+
+    response = test_user_client.get("/api/v1/users", params={"after_id": cursor, "limit": 1})
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert [user["username"] for user in data] == ["otheruser"]
+
+    response = test_user_client.get("/api/v1/users", params={"after_id": other_user.id})
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
 
 def test_read_users_unauthorized(client: TestClient, db: Session) -> None:
     response = client.get("/api/v1/users")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 def test_read_user_me(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    verify_test_user(db, test_user)
-    with override_get_db(db):
-        response = test_user_client.get("/api/v1/users/me")
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert data["username"] == "testuser"
-        assert data["email"] == "test@example.com"
-        assert "password" not in data
-        assert "hashed_password" not in data
+    response = test_user_client.get("/api/v1/users/me")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["username"] == "testuser"
+    assert data["email"] == "test@example.com"
+    assert "password" not in data
+    assert "hashed_password" not in data
 
 def test_read_user_me_unauthorized(client: TestClient) -> None:
     response = client.get("/api/v1/users/me")
     assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 def test_update_user_me(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.put(
-            "/api/v1/users/me",
-            json={
-                "username": "updateduser",
-                "email": "updated@example.com",
-                "password": "newpassword123"
-            }
-        )
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert data["username"] == "updateduser"
-        assert data["email"] == "updated@example.com"
+    response = test_user_client.put(
+        "/api/v1/users/me",
+        json={
+            "username": "updateduser",
+            "email": "updated@example.com",
+            "password": "newpassword123"
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["username"] == "updateduser"
+    assert data["email"] == "updated@example.com"
         
-        # Verify changes in database
-        db.refresh(test_user)
-        assert test_user.username == "updateduser"
-        assert test_user.email == "updated@example.com"
-        assert test_user.verify_password("newpassword123")
+    # Verify changes in database
+    db.refresh(test_user)
+    assert test_user.username == "updateduser"
+    assert test_user.email == "updated@example.com"
+    assert test_user.verify_password("newpassword123")
 
 def test_update_user_me_partial(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.put(
-            "/api/v1/users/me",
-            json={
-                "username": "updateduser"
-                # Only update username
-            }
-        )
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert data["username"] == "updateduser"
-        assert data["email"] == "test@example.com"  # Unchanged
+    response = test_user_client.put(
+        "/api/v1/users/me",
+        json={
+            "username": "updateduser"
+            # Only update username
+        }
+    )
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["username"] == "updateduser"
+    assert data["email"] == "test@example.com"  # Unchanged
         
-        # Verify changes in database
-        db.refresh(test_user)
-        assert test_user.username == "updateduser"
-        assert test_user.email == "test@example.com"
-        assert test_user.verify_password("testpassword123")  # Unchanged
+    # Verify changes in database
+    db.refresh(test_user)
+    assert test_user.username == "updateduser"
+    assert test_user.email == "test@example.com"
+    assert test_user.verify_password("testpassword123")  # Unchanged
+
+def test_read_user_me_after_update(test_user_client: TestClient, test_user: User) -> None:
+    # The first read caches the user; the update must invalidate that entry
+    response = test_user_client.get("/api/v1/users/me")
+    assert response.json()["username"] == "testuser"
+
+    response = test_user_client.put("/api/v1/users/me", json={"username": "updateduser"})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = test_user_client.get("/api/v1/users/me")
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["username"] == "updateduser"
+
+def test_read_user_me_after_deactivation(test_user_client: TestClient, test_user: User) -> None:
+    response = test_user_client.get("/api/v1/users/me")
+    assert response.status_code == status.HTTP_200_OK
+
+    response = test_user_client.put("/api/v1/users/me", json={"is_active": False})
+    assert response.status_code == status.HTTP_200_OK
+
+    response = test_user_client.get("/api/v1/users/me")
+    assert_detail(response, status.HTTP_400_BAD_REQUEST, "inactive user")
+
+def test_read_user_me_after_delete(test_user_client: TestClient, test_user: User) -> None:
+    response = test_user_client.get("/api/v1/users/me")
+    assert response.status_code == status.HTTP_200_OK
+
+    response = test_user_client.delete(f"/api/v1/users/{test_user.id}")
+    assert response.status_code == status.HTTP_200_OK
+
+    response = test_user_client.get("/api/v1/users/me")
+    assert_detail(response, status.HTTP_404_NOT_FOUND, "user not found")
 
 def test_update_user_me_duplicate_username(
+    test_user_client: TestClient, test_user: User, other_user: User
+) -> None:
+    # Try to update to existing username
+    response = test_user_client.put(
+        "/api/v1/users/me",
+        json={
+            "username": "otheruser"  # Already exists
+        }
+    )
+    assert_detail(response, status.HTTP_400_BAD_REQUEST, "username already exists")
+
+def test_update_user_me_null_username(
     test_user_client: TestClient, test_user: User, db: Session
 ) -> None:
-    with override_get_db(db):
-        # Create another user
-        other_user = User(
-            username="otheruser",
-            email="other@example.com",
-            is_active=True
-        )
-        other_user.set_password("password123")
-        db.add(other_user)
-        db.commit()
-        
-        # Try to update to existing username
-        response = test_user_client.put(
-            "/api/v1/users/me",
-            json={
-                "username": "otheruser"  # Already exists
-            }
-        )
-        assert response.status_code == status.HTTP_400_BAD_REQUEST
-        assert "username already exists" in response.json()["detail"].lower()
+    response = test_user_client.put("/api/v1/users/me", json={"username": None})
+    assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    db.refresh(test_user)
+    assert test_user.username == "testuser"
+
+def test_update_user_not_null_violation_is_not_duplicate(test_user: User, db: Session) -> None:
+    # Bypass schema validation to reach the database's NOT NULL check
+    user_in = UserUpdate.model_construct(username=None, _fields_set={"username"})
+    with pytest.raises(IntegrityError):
+        crud_user.update_user(db, user_id=test_user.id, user=user_in)
 
 def test_read_user_by_id(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.get(f"/api/v1/users/{test_user.id}")
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert data["username"] == "testuser"
-        assert data["email"] == "test@example.com"
-        assert "password" not in data
-        assert "hashed_password" not in data
+    response = test_user_client.get(f"/api/v1/users/{test_user.id}")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["username"] == "testuser"
+    assert data["email"] == "test@example.com"
+    assert "password" not in data
+    assert "hashed_password" not in data
 
 def test_read_nonexistent_user(test_user_client: TestClient, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.get("/api/v1/users/999")
-        assert response.status_code == status.HTTP_404_NOT_FOUND
+    response = test_user_client.get("/api/v1/users/999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND
 
 def test_delete_user(test_user_client: TestClient, test_user: User, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.delete(f"/api/v1/users/{test_user.id}")
-        assert response.status_code == status.HTTP_200_OK
-        data = response.json()
-        assert data["username"] == "testuser"
-        assert data["email"] == "test@example.com"
+    response = test_user_client.delete(f"/api/v1/users/{test_user.id}")
+    assert response.status_code == status.HTTP_200_OK
+    data = response.json()
+    assert data["username"] == "testuser"
+    assert data["email"] == "test@example.com"
         
-        # Verify user was deleted from database
-        user = db.query(User).filter(User.id == test_user.id).first()
-        assert user is None
+    # Verify user was deleted from database
+    user = db.query(User).filter(User.id == test_user.id).first()
+    assert user is None
 
 def test_delete_nonexistent_user(test_user_client: TestClient, db: Session) -> None:
-    with override_get_db(db):
-        response = test_user_client.delete("/api/v1/users/999")
-        assert response.status_code == status.HTTP_404_NOT_FOUND 
\ No newline at end of file
+    response = test_user_client.delete("/api/v1/users/999")
+    assert response.status_code == status.HTTP_404_NOT_FOUND 
\ No newline at end of file
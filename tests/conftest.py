@@ -1,15 +1,17 @@
+import os
+
+# Real bcrypt at its minimum work factor; must be set before app settings load
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 import pytest
+from contextvars import ContextVar
 from typing import Generator, Dict
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, insert, inspect, text
 from sqlalchemy.orm import sessionmaker, Session
+import socket
 import time
 from sqlalchemy.exc import OperationalError
-import uvicorn
-import threading
-import requests
-from contextlib import contextmanager
-import os
 import logging
 from testcontainers.postgres import PostgresContainer
 
@@ -19,8 +21,10 @@ from app.db.session import Base, get_db
 from app.core.config import Settings, settings
 from app.models.user import User
 from app.core import security
+from app.crud import user as crud_user
 
-logging.basicConfig(level=logging.DEBUG)
+# Quiet by default; use --log-cli-level=DEBUG to see fixture and app logs
+logging.getLogger().setLevel(logging.WARNING)
 logger = logging.getLogger(__name__)
 
 import importlib
@@ -30,7 +34,7 @@ logger.debug("(Test) app/api/v1/api.py is imported (or reimported)")
 
 @pytest.fixture(scope="session")
 def postgres_container():
-    """Create a PostgreSQL container for testing"""
+    """Create a PostgreSQL container for testing; under xdist each worker starts its own"""
     logger.debug("Starting postgres container")
     container = PostgresContainer(
         image="postgres:15",
@@ -44,7 +48,7 @@ def postgres_container():
     
     # Get the actual exposed port from the container
     exposed_port = container.get_exposed_port(5432)
-    logger.debug(f"Container exposed port: {exposed_port}")
+    logger.debug("Container exposed port: %s", exposed_port)
     
     # Update environment variables for the test database
     os.environ.update({
@@ -53,7 +57,8 @@ def postgres_container():
         "POSTGRES_USER": "postgres",
         "POSTGRES_PASSWORD": "postgres",
         "POSTGRES_DB": "app_test",
-        "ENCRYPTION_KEY": "test-key-123"
+        # A well-formed Fernet key, so legacy password tests can encrypt with it
+        "ENCRYPTION_KEY": "dGVzdC1sZWdhY3ktZmVybmV0LWtleS0zMi1ieXRlcyE="
     })
     
     # Create new settings instance with test values
@@ -63,7 +68,7 @@ def postgres_container():
         setattr(settings, key, value)
     
     # Log the database URL for debugging
-    logger.debug(f"Database URL: {settings.DATABASE_URL}")
+    logger.debug("Database URL: %s", settings.DATABASE_URL)
     
     try:
         yield container
@@ -72,111 +77,79 @@ def postgres_container():
         container.stop()
         logger.debug("Postgres container stopped")
 
-def wait_for_db(max_retries=30, retry_interval=1):  # Increased retries and decreased interval
-    """Wait for database to become available and ready"""
-    logger.debug("Starting wait_for_db")
+def wait_for_port(host: str, port: int, max_retries=30, retry_interval=0.5) -> None:
+    """Wait until something accepts TCP connections on host:port"""
     for i in range(max_retries):
         try:
-            logger.debug(f"Attempt {i+1}/{max_retries} to connect to database")
-            engine = create_engine(str(settings.DATABASE_URL))
-            logger.debug("Engine created, attempting to connect")
-            with engine.connect() as conn:
-                logger.debug("Connected to database, executing test query")
-                # Try to execute a simple query to verify database is ready
-                conn.execute(text("SELECT 1"))
-                logger.debug("Test query successful, creating tables")
-                # Create all tables
-                Base.metadata.create_all(bind=engine)
-                logger.debug("Tables created successfully")
-            return engine
-        except OperationalError as e:
-            logger.error(f"Database not ready, attempt {i+1}/{max_retries}: {str(e)}")
+            with socket.create_connection((host, port), timeout=0.5):
+                return
+        except OSError as e:
+            logger.debug("Database port not open, attempt %s/%s: %s", i+1, max_retries, e)
             if i == max_retries - 1:
                 raise
-            logger.debug(f"Waiting {retry_interval} seconds before next attempt")
             time.sleep(retry_interval)
-    logger.debug("wait_for_db completed successfully")
 
-def wait_for_server(max_retries=5, retry_interval=1):
-    """Wait for server to become available"""
-    logger.debug("Starting wait_for_server")
+def wait_for_db(max_retries=30, retry_interval=0.5):
+    """Wait for database to become available and ready, returning an engine for it"""
+    wait_for_port(settings.POSTGRES_SERVER, int(settings.POSTGRES_PORT))
+    engine = create_engine(str(settings.DATABASE_URL))
+    # The port can open before postgres accepts queries
     for i in range(max_retries):
         try:
-            logger.debug(f"Attempt {i+1}/{max_retries} to connect to server")
-            response = requests.get("http://localhost:8000/api/v1/health")
-            if response.status_code == 200:
-                logger.debug("Server is available and healthy")
-                return
-            logger.debug(f"Server returned status code {response.status_code}")
-        except requests.RequestException as e:
-            logger.error(f"Server not ready, attempt {i+1}/{max_retries}: {str(e)}")
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+            return engine
+        except OperationalError as e:
+            logger.error("Database not ready, attempt %s/%s: %s", i+1, max_retries, e)
             if i == max_retries - 1:
                 raise
-            logger.debug(f"Waiting {retry_interval} seconds before next attempt")
             time.sleep(retry_interval)
-    logger.debug("wait_for_server completed")
 
-@contextmanager
-def run_server():
-    """Run the FastAPI server in a separate thread"""
-    logger.debug("Starting run_server")
-    config = uvicorn.Config(app, host="127.0.0.1", port=8000, log_level="error")
-    server = uvicorn.Server(config)
-    logger.debug("Created uvicorn server, starting thread")
-    thread = threading.Thread(target=server.run)
-    thread.daemon = True
-    thread.start()
-    try:
-        logger.debug("Waiting for server to become available")
-        wait_for_server()
-        logger.debug("Server is available, yielding")
-        yield
-    finally:
-        logger.debug("run_server cleanup")
-        # Server will be killed when the thread is daemon
-        pass
-
-@pytest.fixture(scope="session", autouse=True)
+@pytest.fixture(scope="session")
 def setup_test_environment(postgres_container):
-    """Ensure test environment (database and server) is running before any tests"""
-    logger.debug("Starting setup_test_environment")
+    """Start and wait for the test database; only tests that use it pay for it"""
+    logger.debug("Waiting for database")
+    engine = wait_for_db()
     try:
-        logger.debug("Waiting for database")
-        wait_for_db()
-        logger.debug("Database is ready, starting server")
-        with run_server():
-            logger.debug("Server is running, yielding to tests")
-            yield
-    except Exception as e:
-        logger.error(f"Error in setup_test_environment: {str(e)}")
-        raise
+        yield engine
     finally:
-        logger.debug("setup_test_environment cleanup completed")
+        engine.dispose()
+
+# Hashed once per run and reused by the user fixtures
+_TEST_USER_HASHED_PASSWORD = security.get_password_hash("testpassword123")
+_OTHER_USER_HASHED_PASSWORD = security.get_password_hash("password123")
+
+# Sessions bound to an already-open transaction commit/rollback SAVEPOINTs only
+TestingSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    expire_on_commit=False,  # Match app.db.session.SessionLocal
+    join_transaction_mode="create_savepoint",
+)
 
-# Use test database for testing
-TEST_SQLALCHEMY_DATABASE_URL = str(settings.DATABASE_URL)
+# The current test's session, set by the db fixture
+_current_db: ContextVar[Session] = ContextVar("_current_db")
 
-engine = create_engine(TEST_SQLALCHEMY_DATABASE_URL)
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+async def _get_test_db() -> Session:
+    return _current_db.get()
+
+app.dependency_overrides[get_db] = _get_test_db
 
 @pytest.fixture(scope="session")
-def db_engine():
-    """Create database engine and tables"""
-    logger.debug("Starting db_engine fixture")
+def db_engine(setup_test_environment):
+    """Create the tables, reusing the engine from setup_test_environment"""
+    engine = setup_test_environment
+    # Schema is created once per session; tests are isolated by SAVEPOINTs
+    if not inspect(engine).has_table(User.__tablename__):
+        Base.metadata.create_all(bind=engine)
     try:
-        logger.debug("Getting engine from wait_for_db")
-        engine = wait_for_db()
-        logger.debug("Engine created successfully")
         yield engine
     finally:
-        logger.debug("Starting db_engine cleanup")
-        # Clean up
         Base.metadata.drop_all(bind=engine)
-        logger.debug("db_engine cleanup completed")
 
 @pytest.fixture(scope="function")
 def db(db_engine) -> Generator[Session, None, None]:
-    """Create a fresh database session for each test"""
+    """Run each test in a transaction that is rolled back afterwards"""
     logger.debug("Starting to create new database session")
     connection = db_engine.connect()
     logger.debug("Database connection established")
@@ -184,11 +157,13 @@ def db(db_engine) -> Generator[Session, None, None]:
     logger.debug("Transaction begun")
     session = TestingSessionLocal(bind=connection)
     logger.debug("Session created")
+    token = _current_db.set(session)
     
     try:
         logger.debug("Yielding database session to test")
         yield session
     finally:
+        _current_db.reset(token)
         logger.debug("Starting database session cleanup")
         try:
             logger.debug("Closing session")
@@ -199,66 +174,74 @@ def db(db_engine) -> Generator[Session, None, None]:
             connection.close()
             logger.debug("Database session cleanup completed")
         except Exception as e:
-            logger.error(f"Error during database cleanup: {str(e)}")
+            logger.error("Error during database cleanup: %s", e)
             raise
 
+@pytest.fixture(scope="session")
+def app_client(db_engine) -> Generator[TestClient, None, None]:
+    """A single TestClient whose lifespan runs once for the whole session"""
+    with TestClient(app) as test_client:
+        yield test_client
+
 @pytest.fixture(scope="function")
-def client(db: Session) -> Generator[TestClient, None, None]:
-    """Create a test client with database session override"""
-    logger.debug("Starting client fixture setup")
-    try:
-        def override_get_db():
-            logger.debug("override_get_db called")
-            try:
-                logger.debug("Yielding db session")
-                yield db
-            finally:
-                logger.debug("override_get_db cleanup")
-                pass  # Don't close the session here, it's managed by the db fixture
-        
-        logger.debug("Setting up dependency override")
-        app.dependency_overrides[get_db] = override_get_db
-        logger.debug("Creating TestClient")
-        with TestClient(app) as test_client:
-            logger.debug("TestClient created, yielding")
-            yield test_client
-        logger.debug("TestClient context exited")
-    finally:
-        logger.debug("Clearing dependency overrides")
-        app.dependency_overrides.clear()
-        logger.debug("Client fixture cleanup completed")
+def client(app_client: TestClient, db: Session) -> TestClient:
+    """The shared test client; get_db serves the current test's session"""
+    return app_client
+
+# Users present for the whole session; each test's changes to them are rolled back
+_SEED_USERS = [
+    {
+        "username": "testuser",
+        "email": "test@example.com",
+        "hashed_password": _TEST_USER_HASHED_PASSWORD,
+        "is_active": True,
+    },
+]
+
+@pytest.fixture(scope="session")
+def seed_users(db_engine) -> Dict[str, int]:
+    """Bulk-insert the session's seed users once, returning their ids by username"""
+    with db_engine.begin() as conn:
+        rows = conn.execute(insert(User).returning(User.id, User.username), _SEED_USERS)
+        return {username: user_id for user_id, username in rows}
+
+@pytest.fixture(scope="session")
+def test_user_id(seed_users: Dict[str, int]) -> int:
+    return seed_users["testuser"]
 
 @pytest.fixture(scope="function")
-def test_user(db: Session) -> User:
-    """Create a test user for each test"""
-    logger.debug("Starting test_user fixture setup")
-    try:
-        logger.debug("Creating User object")
-        user = User(
-            username="testuser",
-            email="test@example.com",
-            is_active=True
-        )
-        logger.debug("Setting user password")
-        user.set_password("testpassword123")
-        logger.debug("Adding user to session")
-        db.add(user)
-        logger.debug("Committing user to database")
-        db.commit()
-        logger.debug("Refreshing user from database")
-        db.refresh(user)
-        logger.debug(f"Successfully created test user with id: {user.id}")
-        return user
-    except Exception as e:
-        logger.error(f"Error in test_user fixture: {str(e)}")
-        raise
+def test_user(db: Session, test_user_id: int) -> User:
+    """The shared test user, loaded into this test's session"""
+    user = db.get(User, test_user_id)
+    assert user is not None, "Test user should exist in database"
+    yield user
+    # The row is rolled back after each test, so drop any cached copy as well
+    crud_user.invalidate_cached_user(test_user_id)
 
 @pytest.fixture(scope="function")
-def test_user_token(test_user: User) -> Dict[str, str]:
-    access_token = security.create_access_token(test_user.id)
+def other_user(db: Session) -> User:
+    """A second user, inserted inside the test's transaction so only its test sees it"""
+    user = User(
+        username="otheruser",
+        email="other@example.com",
+        hashed_password=_OTHER_USER_HASHED_PASSWORD,
+        is_active=True
+    )
+    db.add(user)
+    db.flush()
+    return user
+
+@pytest.fixture(scope="session")
+def test_user_token(test_user_id: int) -> Dict[str, str]:
+    access_token = security.create_access_token(test_user_id)
     return {"Authorization": f"Bearer {access_token}"}
 
+@pytest.fixture(scope="session")
+def test_user_app_client(test_user_token: Dict[str, str]) -> Generator[TestClient, None, None]:
+    """A session-wide TestClient that sends the test user's token with every request"""
+    with TestClient(app, headers=test_user_token) as test_client:
+        yield test_client
+
 @pytest.fixture(scope="function")
-def test_user_client(client: TestClient, test_user_token: Dict[str, str]) -> TestClient:
-    client.headers = test_user_token
-    return client 
\ No newline at end of file
+def test_user_client(test_user_app_client: TestClient, db: Session) -> TestClient:
+    return test_user_app_client
@@ -0,0 +1,19 @@
+import pytest
+from typing import Callable
+
+from app.core import security
+
+@pytest.fixture(scope="session")
+def access_token() -> str:
+    """A token for user 1, shared by the tests that only need a valid token"""
+    return security.create_access_token(1)
+
+@pytest.fixture
+def clear_token_cache() -> Callable[[], None]:
+    """Empty the verified-token cache now, and return a function that empties it again"""
+    def clear() -> None:
+        with security._token_cache_lock:
+            security._token_cache.clear()
+
+    clear()
+    return clear
@@ -1,15 +1,18 @@
+import string
 import pytest
 from datetime import timedelta
+from typing import Callable
+from unittest.mock import Mock
 from fastapi import HTTPException
+from freezegun import freeze_time
+from hypothesis import given, strategies as st
 
 from app.core import security
 from app.core.config import settings
 
-def test_create_access_token() -> None:
-    user_id = 1
-    token = security.create_access_token(user_id)
-    assert isinstance(token, str)
-    assert len(token) > 0
+def test_create_access_token(access_token: str) -> None:
+    assert isinstance(access_token, str)
+    assert len(access_token) > 0
 
 def test_create_access_token_with_expires_delta() -> None:
     user_id = 1
@@ -18,11 +21,32 @@ def test_create_access_token_with_expires_delta() -> None:
     assert isinstance(token, str)
     assert len(token) > 0
 
-def test_verify_token() -> None:
+def test_verify_token(access_token: str) -> None:
+    verified_id = security.verify_token(access_token)
+    assert verified_id == 1
+
+def test_verify_token_cached(
+    monkeypatch: pytest.MonkeyPatch, clear_token_cache: Callable[[], None]
+) -> None:
     user_id = 1
     token = security.create_access_token(user_id)
-    verified_id = security.verify_token(token)
-    assert verified_id == user_id
+    decode = Mock(wraps=security._decode_token)
+    monkeypatch.setattr(security, "_decode_token", decode)
+    assert security.verify_token(token) == user_id
+    assert security.verify_token(token) == user_id
+    decode.assert_called_once()
+
+def test_verify_tokens_batch(
+    monkeypatch: pytest.MonkeyPatch, clear_token_cache: Callable[[], None]
+) -> None:
+    tokens = [security.create_access_token(user_id) for user_id in range(1, 101)]
+    decode = Mock(wraps=security._decode_token)
+    monkeypatch.setattr(security, "_decode_token", decode)
+    assert security.verify_tokens(tokens) == list(range(1, 101))
+    assert decode.call_count == 100
+
+    clear_token_cache()
+    assert [security.verify_token(token) for token in tokens] == list(range(1, 101))
 
 def test_verify_token_invalid() -> None:
     with pytest.raises(HTTPException) as exc_info:
@@ -30,15 +54,70 @@ def test_verify_token_invalid() -> None:
     assert exc_info.value.status_code == 401
     assert "Could not validate credentials" in str(exc_info.value.detail)
 
-def test_verify_token_expired() -> None:
-    user_id = 1
-    # Create a token that expires immediately
-    token = security.create_access_token(user_id, expires_delta=timedelta(microseconds=1))
-    # Wait a moment to ensure token expires
-    import time
-    time.sleep(0.1)
-    
+def test_verify_token_failures_are_not_shared() -> None:
+    errors = []
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc_info:
+            security.verify_token("invalid_token")
+        errors.append(exc_info.value)
+    assert errors[0] is not errors[1]
+    assert errors[0].headers is not errors[1].headers
+
+def test_verify_token_tampered_signature(access_token: str) -> None:
+    signing_input, signature = access_token.rsplit(".", 1)
+    tampered = signing_input + "." + ("A" if signature[0] != "A" else "B") + signature[1:]
+    with pytest.raises(HTTPException) as exc_info:
+        security.verify_token(tampered)
+    assert exc_info.value.status_code == 401
+
+@pytest.mark.parametrize("mangle", [
+    lambda sig: sig + "!",
+    lambda sig: sig[:10] + "*" + sig[10:],
+    lambda sig: sig + "=",
+    lambda sig: sig.replace("-", "+").replace("_", "/") if "-" in sig or "_" in sig else "+" + sig,
+], ids=["trailing-bang", "embedded-star", "padding", "standard-alphabet"])
+def test_verify_token_rejects_non_alphabet_signature(
+    access_token: str, mangle: Callable[[str], str],
+) -> None:
+    signing_input, signature = access_token.rsplit(".", 1)
+    with pytest.raises(HTTPException) as exc_info:
+        security.verify_token(signing_input + "." + mangle(signature))
+    assert exc_info.value.status_code == 401
+
+@given(st.text(min_size=1, max_size=500))
+def test_verify_token_rejects_garbage(token: str) -> None:
     with pytest.raises(HTTPException) as exc_info:
         security.verify_token(token)
     assert exc_info.value.status_code == 401
-    assert "Could not validate credentials" in str(exc_info.value.detail) 
\ No newline at end of file
+
+_segment = st.text(alphabet=string.ascii_letters + string.digits + "-_=", max_size=80)
+
+@given(st.lists(_segment, min_size=1, max_size=5).map(".".join))
+def test_verify_token_rejects_malformed_segments(token: str) -> None:
+    with pytest.raises(HTTPException):
+        security.verify_token(token)
+
+@given(st.binary(min_size=32, max_size=32))
+def test_verify_token_rejects_forged_signature(signature: bytes) -> None:
+    signing_input = security.create_access_token(1).rsplit(".", 1)[0]
+    forged = signing_input + "." + security._b64encode(signature).decode()
+    with pytest.raises(HTTPException):
+        security.verify_token(forged)
+
+def test_verify_token_expired() -> None:
+    user_id = 1
+    with freeze_time() as frozen:
+        token = security.create_access_token(user_id, expires_delta=timedelta(seconds=1))
+        frozen.tick(timedelta(seconds=2))
+        with pytest.raises(HTTPException) as exc_info:
+            security.verify_token(token)
+    assert exc_info.value.status_code == 401
+    assert "Could not validate credentials" in str(exc_info.value.detail) 
+@pytest.mark.parametrize("expires_delta", [timedelta(milliseconds=500), timedelta(seconds=1.5), None])
+def test_access_token_lasts_its_full_lifetime(expires_delta: timedelta) -> None:
+    lifetime = expires_delta or timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    # A fractional start exposes any truncation of now or of the delta
+    with freeze_time("2026-01-01 00:00:00.900") as frozen:
+        token = security.create_access_token(1, expires_delta=expires_delta)
+        frozen.tick(lifetime - timedelta(milliseconds=1))
+        assert security.verify_token(token) == 1
@@ -0,0 +1,6 @@
+from httpx import Response
+
+def assert_detail(response: Response, status_code: int, substring: str) -> None:
+    """Assert an error response's status and that its detail mentions substring"""
+    assert response.status_code == status_code, response.text
+    assert substring in response.json()["detail"].lower()